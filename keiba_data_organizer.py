@@ -9,8 +9,257 @@ import streamlit as st
 import pandas as pd
 import re
 import io
+import csv
 from datetime import datetime
 import json
+import functools
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Excel出力はxlsxwriterがあれば優先（openpyxlより高速）
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# 競馬場名（JRA競馬場 + 地方競馬場）
+_JRA_VENUES = ('東京', '中山', '阪神', '京都', '新潟', '福島', '小倉', '札幌', '函館', '中京')
+_LOCAL_VENUES = ('佐賀', '笠松', '園田', '姫路', '高知', '金沢', '浦和', '船橋', '大井', '川崎', '盛岡', '水沢', '門別')
+_ALL_VENUES = _JRA_VENUES + _LOCAL_VENUES
+
+# st.cache_dataの上限（全セッションで共有されるため、入力テキストごとの結果を無制限に溜めない）
+_PARSE_CACHE_MAX_ENTRIES = 32
+_OUTPUT_CACHE_MAX_ENTRIES = _PARSE_CACHE_MAX_ENTRIES * 5  # 入力テキストごとに最大5種類の出力
+_EXCEL_CACHE_MAX_ENTRIES = _PARSE_CACHE_MAX_ENTRIES  # 入力テキストと出力オプションの組み合わせごと
+
+# サイト関連用語（レース名から除外）
+_SITE_TERMS = frozenset({
+    'netkeiba', 'netkeibaTV', '馬名で検索', 'お気に入り馬', 'メモ', 'アカウント',
+    'LIVE競輪', 'トップ', 'ニュース', 'レース', 'A I', '予想', 'UMAIビルダー',
+    'コラム', '地方競馬', 'データベース', 'ショップ', '競馬新聞', '俺プロ',
+    '一口馬主', 'POG', 'まとめ', '前', '次', '福島', '小倉', '函館'
+})
+
+# 出走馬詳細CSVの列（past_racesは最新3走の文字列に置き換え）
+_HORSE_CSV_COLUMNS = (
+    'frame_number', 'horse_number', 'horse_name', 'father', 'mother', 'mother_father',
+    'trainer', 'jockey', 'weight', 'age', 'sex', 'coat_color', 'odds', 'popularity',
+    'stable_type', 'recent_form', 'load_weight', 'recent_3_races'
+)
+
+# 詳細レース成績CSVの列
+_RESULT_CSV_COLUMNS = (
+    'horse_name', 'frame_number', 'horse_number', 'race_date', 'venue', 'race_name',
+    'course_info', 'finish_position', 'field_size', 'popularity', 'time', 'jockey', 'weight'
+)
+
+# 出走馬一覧の列（馬データのキー → 表示名）
+_SUMMARY_COLUMN_NAMES = {
+    'frame_number': '枠', 'horse_number': '馬番', 'horse_name': '馬名', 'jockey': '騎手',
+    'trainer': '調教師', 'age': '年齢', 'sex': '性別', 'odds': 'オッズ',
+    'popularity': '人気', 'weight': '馬体重'
+}
+
+# 過去５レース成績タブの列
+_PAST_RACE_COLUMNS = ('日付', '競馬場', 'コース', '着順', '通過順位', '頭数', '人気', 'タイム', 'タイム差')
+
+# 統合Excelの過去成績シートの列
+_EXCEL_RESULT_COLUMNS = ('馬名', '日付', '競馬場', 'コース', '着順', '頭数', '人気', 'タイム')
+
+# 解析結果の雛形（dict.copy()で複製して使用）
+_HORSE_TEMPLATE = {
+    'frame_number': '',
+    'horse_number': '',
+    'horse_name': '',
+    'father': '',
+    'mother': '',
+    'mother_father': '',
+    'trainer': '',
+    'jockey': '',
+    'weight': '',
+    'age': '',
+    'sex': '',
+    'coat_color': '',
+    'odds': '',
+    'popularity': '',
+    'past_races': None,  # 馬ごとに新しいリストを設定
+    'stable_type': '',
+    'recent_form': '',
+    'load_weight': ''
+}
+_RACE_RESULT_TEMPLATE = {
+    'date': '',
+    'venue': '',
+    'race_name': '',
+    'course_info': '',
+    'finish_position': '',
+    'passage_position': '',
+    'field_size': '',
+    'popularity': '',
+    'jockey': '',
+    'weight': '',
+    'time': '',
+    'track_condition': '',
+    'winner_name': '',
+    'time_diff': ''
+}
+_TRAINING_TEMPLATE = {
+    'horse_name': '',
+    'date': '',
+    'course': '',
+    'condition': '',
+    'jockey': '',
+    'time': '',
+    'evaluation': ''
+}
+
+# 解析ステート
+_STATE_RACE_INFO = 0
+_STATE_HORSES = 1
+_STATE_TRAINING = 2
+
+# レース基本情報の必須項目（通常最後に揃う項目から順に判定）
+_REQUIRED_RACE_FIELDS = (
+    'prize_money', 'entry_count', 'venue', 'distance', 'course_type', 'time', 'race_number'
+)
+
+# 正規表現パターン（事前コンパイル）
+# 調教セクション
+_RE_TRAINING_HEADER = re.compile(r'枠\s+馬\s*番.*馬名.*日付.*コース.*馬場.*乗り役')
+_RE_SLASH_DATE = re.compile(r'\d{4}/\d{2}/\d{2}')
+_RE_DECIMAL = re.compile(r'\d+\.\d+')
+
+# レース基本情報
+_RE_NOT_RACE_NAME = re.compile(r'[0-9:]|発走|天候|馬場|回|日目|頭|万円|takashi|さん')
+# 発走時刻・距離・コース・方向・天候・馬場状態（各項目を行頭からの先読みで個別に検索）
+_RE_RACE_META = re.compile(
+    r'(?=(?:.*?(?P<time>\d{1,2}:\d{2})発走)?)'
+    r'(?=(?:.*?(?P<course_type>[ダ芝])(?P<distance>\d+)m)?)'
+    r'(?=(?:.*?\((?P<direction>[右左]))?)'
+    r'(?=(?:.*?天候:(?P<weather>[^/]+))?)'
+    r'(?=(?:.*?馬場:(?P<condition>\S+))?)'
+)
+_RE_MEETING = re.compile(r'\d+回.*\d+日目')
+_RE_ENTRY_COUNT_LINE = re.compile(r'\s+(\d+)頭$')
+_RE_ENTRY_COUNT = re.compile(r'(\d+)頭')
+
+# 出走馬データ
+_RE_FRAME_HORSE = re.compile(r'^(\d+)\s+(\d+)\s*$')
+_RE_MOTHER_FATHER = re.compile(r'\(([^)]+)\)')
+_RE_STABLE = re.compile(r'(美浦|栗東)・(.+)')
+_RE_WEIGHT = re.compile(r'(\d+)kg\(([+-]?\d+)\)')
+_RE_ODDS = re.compile(r'(\d+\.\d+)\s+\((\d+)人気\)')
+_RE_AGE_SEX = re.compile(r'^([牡牝セ])(\d+)(.+)$')
+
+# 過去レース成績
+_RE_DATE = re.compile(r'(\d{4})\.(\d{2})\.(\d{2})')
+_RE_VENUE_FINISH = re.compile('(' + '|'.join(_ALL_VENUES) + r')(\d+)')
+_RE_VENUE_ANY = re.compile('|'.join(_ALL_VENUES))
+_RE_COURSE = re.compile(r'([ダ芝])(\d+)')
+_RE_TIME = re.compile(r'(\d+:\d+\.\d+)')
+_RE_TRACK = re.compile(r'(良|稍重|重|不良)')
+_RE_BASIC_INFO = re.compile(r'(\d+)頭\s+(\d+)番\s+(\d+)人')
+_RE_PASSAGE_DETAILED = re.compile(r'(\d+)-(\d+)-(\d+)-(\d+)')
+_RE_PASSAGE_SIMPLE = re.compile(r'(\d+)-(\d+)')
+_RE_ALT_RESULT = re.compile(r'(\d+)着.*?(\d+)頭.*?(\d+)番')
+_RE_POPULARITY = re.compile(r'(\d+)番人気')
+# レース名キーワード（JRA: クラス/未勝利/特別/S、地方: 杯/賞/記念/JRA/交流）
+_RE_RACE_NAME_KEYWORD = re.compile('クラス|未勝利|特別|S|杯|賞|記念|JRA|交流')
+# 勝ち馬名(タイム差)：馬名部分に日本語またはアルファベットを含むもののみ
+_RE_WINNER_DIFF = re.compile(
+    r'''(
+        (?=[^()]*[あ-んア-ンー一-龯a-zA-Z])  # 馬名に使われる文字を含む（括弧はまたがない）
+        [^()]+
+    )
+    \(([0-9.-]+)\)                        # タイム差
+    ''',
+    re.VERBOSE
+)
+
+def _dumps_json(data):
+    """JSON文字列に変換（orjsonがあれば優先して使用）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+def _dumps_json_bytes(data):
+    """UTF-8のJSONバイト列に変換（orjsonの出力をデコードせずに返す）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+def _new_csv_writer():
+    """BOM付きUTF-8のバイト列へ直接書き込むCSVライターを作成"""
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='utf-8-sig', newline='')
+    return stream, csv.writer(stream, lineterminator='\n')
+
+def _is_decimal_number(text):
+    """"58.0" のような「数字.数字」のみの文字列か判定"""
+    integer_part, dot, fraction_part = text.partition('.')
+    return bool(dot) and integer_part.isdecimal() and fraction_part.isdecimal()
+
+def _search_lines(pattern, lines, start, stop):
+    """lines[start:stop]を先頭から順に検索し、最初のマッチを返す"""
+    for index in range(start, stop):
+        match = pattern.search(lines[index])
+        if match:
+            return match
+    return None
+
+def _as_string_cell(worksheet, value):
+    """'='で始まる文字列を数式ではなく文字列セルとして返す（openpyxl用）"""
+    if isinstance(value, str) and value.startswith('='):
+        cell = WriteOnlyCell(worksheet, value)
+        cell.data_type = 's'
+        return cell
+    return value
+
+def _create_excel_bytes(sheets):
+    """(シート名, 列名, 行のイテラブル)の並びからExcelファイルのバイト列を作成"""
+    buffer = io.BytesIO()
+    # DataFrameを経由せず、行をそのままワークシートに書き込む
+    if xlsxwriter is not None:
+        # 行を順に書くのでconstant_memoryで出力し、文字列のURL・数式変換は行わない
+        workbook = xlsxwriter.Workbook(buffer, {
+            'constant_memory': True,
+            'strings_to_urls': False,
+            'strings_to_formulas': False
+        })
+        for sheet_name, columns, rows in sheets:
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, columns)
+            for row_index, row in enumerate(rows, 1):
+                worksheet.write_row(row_index, 0, row)
+        workbook.close()
+        return buffer.getvalue()
+    
+    # openpyxlはwrite_onlyモードで行を逐次書き込み（Cellオブジェクトを保持しない）
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet_name, columns, rows in sheets:
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append(columns)
+        for row in rows:
+            # xlsxwriter側(strings_to_formulas=False)と同様、'='で始まる文字列は数式にしない
+            if any(isinstance(value, str) and value.startswith('=') for value in row):
+                row = [_as_string_cell(worksheet, value) for value in row]
+            worksheet.append(row)
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=_OUTPUT_CACHE_MAX_ENTRIES)
+def _cached_output(data_key, method_name, _organizer):
+    """CSV/JSON出力を入力テキスト(data_key)ごとにキャッシュして返す"""
+    return getattr(_organizer, method_name)()
+
+@st.cache_data(show_spinner=False, max_entries=_EXCEL_CACHE_MAX_ENTRIES)
+def _cached_excel(data_key, output_options, _sheets):
+    """統合Excelを入力テキスト(data_key)と出力オプションごとにキャッシュして返す"""
+    return _create_excel_bytes(_sheets)
 
 class KeibaDataOrganizer:
     """競馬データ専用の整理クラス"""
@@ -22,19 +271,13 @@ class KeibaDataOrganizer:
     
     def parse_keiba_data(self, text):
         """競馬データを詳細解析"""
-        lines = [line.strip() for line in text.split('\n') if line.strip()]
+        lines = [line for line in map(str.strip, text.split('\n')) if line]
         
-        # 調教データセクションを除外
-        filtered_lines = self.filter_training_section(lines)
+        # レース基本情報・調教データを1パスで抽出
+        race_end = self.parse_stream(lines)
         
-        # レース基本情報を抽出
-        self.race_info = self.extract_race_info(filtered_lines)
-        
-        # 馬データを抽出
-        self.horses_data = self.extract_horses_data(filtered_lines)
-        
-        # 調教データを抽出
-        self.training_data = self.extract_training_data(lines)
+        # 馬データを抽出（調教データセクションより前のみ）
+        self.horses_data = self.extract_horses_data(lines, race_end)
         
         return {
             'race_info': self.race_info,
@@ -42,79 +285,8 @@ class KeibaDataOrganizer:
             'training_data': self.training_data
         }
     
-    def filter_training_section(self, lines):
-        """調教データセクションを除外"""
-        filtered_lines = []
-        skip_training_data = False
-        
-        for i, line in enumerate(lines):
-            # 調教タイムセクションヘッダーを検出
-            if '調教タイム' in line:
-                skip_training_data = True
-                continue
-            
-            # 調教セクション内のヘッダー行を検出
-            if (skip_training_data or 
-                re.search(r'枠\s+馬\s*番.*馬名.*日付.*コース.*馬場.*乗り役', line)):
-                skip_training_data = True
-                continue
-            
-            # 調教データっぽい行をスキップ
-            if skip_training_data:
-                # 調教データのパターンをチェック
-                training_patterns = [
-                    r'前走.*\d{4}/\d{2}/\d{2}.*美[坂Ｗ]',  # 前走 日付 美坂/美W
-                    r'美[坂Ｗ].*良.*[助手騎手杉原内田]',      # 美坂/美W 良 助手/騎手
-                    r'^\d+\.\d+$',                        # タイム単体
-                    r'^\(\d+\.\d+\)$',                    # ラップタイム
-                    r'外.*強め.*併せ.*秒.*先着',            # 併せ馬コメント
-                    r'^\d+\s+[ＧＢＣ]強\s+動き.*[ＢＣ]$',    # 評価行
-                    r'提供：デイリースポーツ',               # 提供者情報
-                    r'すべての最終調教を見る',               # リンク
-                    r'^-$',                              # ハイフン単体
-                    r'ラップ表示',                        # ラップ表示ヘッダー
-                    r'位置\s+脚色\s+評価',                # 評価ヘッダー
-                    r'まずまず|動き上々',                  # 評価コメント
-                ]
-                
-                is_training_data = False
-                for pattern in training_patterns:
-                    if re.search(pattern, line):
-                        is_training_data = True
-                        break
-                
-                if is_training_data:
-                    continue
-                
-                # セクション終了の判定
-                # 新しいページセクション開始 or 他のセクション開始
-                if (any(keyword in line for keyword in [
-                    'いま競輪が熱い', 'netkeiba', '利用者数', 'カテゴリ', 
-                    'ニュース', 'レース', 'お気に入り馬', '検索バー', 
-                    'みんなで一緒に競馬', 'URL', '© NET DREAMERS'
-                ])):
-                    skip_training_data = False
-                    # これらの行も除外
-                    continue
-                
-                # 通常データの再開（次の馬のデータなど）
-                if re.match(r'^\d+\s+\d+\s*$', line):
-                    skip_training_data = False
-                    filtered_lines.append(line)
-                # レース情報の再開
-                elif any(keyword in line for keyword in ['発走', 'R', '歳以上', 'クラス']):
-                    skip_training_data = False
-                    filtered_lines.append(line)
-                else:
-                    # 調教セクション内の不明な行は除外
-                    continue
-            else:
-                filtered_lines.append(line)
-        
-        return filtered_lines
-    
-    def extract_race_info(self, lines):
-        """レース基本情報を抽出"""
+    def parse_stream(self, lines):
+        """レース基本情報・調教データを1パスで抽出し、調教データセクションの開始位置を返す"""
         race_info = {
             'race_number': '',
             'race_name': '',
@@ -130,354 +302,321 @@ class KeibaDataOrganizer:
             'prize_money': '',
             'entry_count': ''
         }
+        training_data = []
         
-        for line in lines:
-            # レース番号
-            if re.search(r'^\d+R$', line.strip()):
-                race_info['race_number'] = line.strip()
+        state = _STATE_RACE_INFO
+        in_training_section = False
+        race_end = len(lines)
+        
+        for i, line in enumerate(lines):
+            # 調教タイムセクションヘッダーを検出
+            if '調教タイム' in line:
+                in_training_section = True
+                if state != _STATE_TRAINING:
+                    state = _STATE_TRAINING
+                    race_end = i
+                continue
             
-            # レース名（特別レース名を優先、条件レースは補助的に）
-            # レース名が未設定の場合のみ設定
-            if not race_info['race_name']:
-                # サイト関連用語の除外
-                site_terms = [
-                    'netkeiba', 'netkeibaTV', '馬名で検索', 'お気に入り馬', 'メモ', 'アカウント',
-                    'LIVE競輪', 'トップ', 'ニュース', 'レース', 'A I', '予想', 'UMAIビルダー',
-                    'コラム', '地方競馬', 'データベース', 'ショップ', '競馬新聞', '俺プロ',
-                    '一口馬主', 'POG', 'まとめ', '前', '次', '福島', '小倉', '函館'
-                ]
-                
-                if line.strip() in site_terms:
-                    continue
-                
-                # 特別レース名（G1、G2、G3、OP、S、杯、賞、記念などを含むレース）
-                if (re.search(r'[GSL]$', line.strip()) or 
-                    (re.search(r'[杯記念]', line) and not re.search(r'本賞金|賞金', line)) or
-                    (len(line.strip()) <= 10 and 
-                     not re.search(r'[0-9:]|発走|天候|馬場|回|日目|頭|万円|takashi|さん', line))):
-                    race_info['race_name'] = line.strip()
+            if state != _STATE_TRAINING:
+                # 調教セクション内のヘッダー行を検出（以降は調教データとして除外）
+                if _RE_TRAINING_HEADER.search(line):
+                    state = _STATE_TRAINING
+                    race_end = i
+                elif state == _STATE_RACE_INFO:
+                    self.update_race_info(race_info, line)
+                    # 必要な項目がすべて揃ったらレース基本情報の抽出を終了
+                    if all(race_info[field] for field in _REQUIRED_RACE_FIELDS):
+                        state = _STATE_HORSES
+                elif not race_info['race_name']:
+                    # レース名だけは見つかるまで後続の行からも探す
+                    self.update_race_name(race_info, line)
             
-            # 条件レース（特別レース名がない場合のみ）
-            elif not race_info['race_name'] and re.search(r'[3-9]歳以上.*クラス', line):
-                race_info['race_name'] = line.strip()
+            # 調教データを抽出
+            if in_training_section and _RE_DECIMAL.search(line):
+                training_data.append(self.parse_training_line(line))
+        
+        self.race_info = race_info
+        self.training_data = training_data
+        return race_end
+    
+    def update_race_name(self, race_info, line):
+        """レース名が未設定の場合のみ1行分を判定して設定（サイト関連用語の行はFalseを返す）"""
+        if race_info['race_name']:
+            return True
+        
+        # サイト関連用語の除外
+        if line in _SITE_TERMS:
+            return False
+        
+        # 特別レース名（G1、G2、G3、OP、S、杯、賞、記念などを含むレース）
+        if (line.endswith(('G', 'S', 'L')) or 
+            (('杯' in line or '記' in line or '念' in line) and '賞金' not in line) or
+            (len(line) <= 10 and 
+             not _RE_NOT_RACE_NAME.search(line))):
+            race_info['race_name'] = line
+        return True
+    
+    def update_race_info(self, race_info, line):
+        """1行分のレース基本情報を反映（lineは前後の空白除去済み）"""
+        # レース番号
+        if line.endswith('R') and line[:-1].isdecimal():
+            race_info['race_number'] = line
+        
+        # レース名（サイト関連用語の行は以降の項目も判定しない）
+        if not self.update_race_name(race_info, line):
+            return
+        
+        # 発走時刻・距離・コース・天候（1行にまとまっている）
+        if '発走' in line and 'm' in line:
+            meta = _RE_RACE_META.match(line)
             
-            # 発走時刻・距離・コース・天候（1行にまとまっている）
-            if '発走' in line and 'm' in line:
-                # 発走時刻
-                time_match = re.search(r'(\d{1,2}:\d{2})発走', line)
-                if time_match:
-                    race_info['time'] = time_match.group(1)
-                
-                # 距離・コース
-                distance_match = re.search(r'([ダ芝])(\d+)m', line)
-                if distance_match:
-                    race_info['course_type'] = distance_match.group(1)
-                    race_info['distance'] = distance_match.group(2) + 'm'
-                
-                # 方向（「右 B」のような場合でも「右」のみ抽出）
-                direction_match = re.search(r'\(([右左])', line)
-                if direction_match:
-                    race_info['direction'] = direction_match.group(1)
-                
-                # 天候
-                weather_match = re.search(r'天候:([^/]+)', line)
-                if weather_match:
-                    race_info['weather'] = weather_match.group(1).strip()
-                
-                # 馬場状態
-                condition_match = re.search(r'馬場:(\S+)', line)
-                if condition_match:
-                    race_info['track_condition'] = condition_match.group(1).strip()
+            # 発走時刻
+            if meta['time']:
+                race_info['time'] = meta['time']
+            
+            # 距離・コース
+            if meta['course_type']:
+                race_info['course_type'] = meta['course_type']
+                race_info['distance'] = meta['distance'] + 'm'
             
-            # 開催情報（○回○○○日目）
-            if re.search(r'\d+回.*\d+日目', line):
-                race_info['venue'] = line.strip()
+            # 方向（「右 B」のような場合でも「右」のみ抽出）
+            if meta['direction']:
+                race_info['direction'] = meta['direction']
             
-            # 頭数（15頭など）
-            if re.search(r'\s+(\d+)頭$', line):
-                entry_match = re.search(r'(\d+)頭', line)
-                if entry_match:
-                    race_info['entry_count'] = entry_match.group(1) + '頭'
+            # 天候
+            if meta['weather']:
+                race_info['weather'] = meta['weather'].strip()
             
-            # 賞金
-            if '本賞金:' in line:
-                race_info['prize_money'] = line.strip()
+            # 馬場状態
+            if meta['condition']:
+                race_info['track_condition'] = meta['condition']
         
-        return race_info
+        # 開催情報（○回○○○日目）
+        if '日目' in line and _RE_MEETING.search(line):
+            race_info['venue'] = line
+        
+        # 頭数（15頭など）
+        if line.endswith('頭') and _RE_ENTRY_COUNT_LINE.search(line):
+            entry_match = _RE_ENTRY_COUNT.search(line)
+            if entry_match:
+                race_info['entry_count'] = entry_match.group(1) + '頭'
+        
+        # 賞金
+        if '本賞金:' in line:
+            race_info['prize_money'] = line
     
-    def extract_horses_data(self, lines):
-        """馬データを詳細抽出"""
-        horses = []
+    def extract_horses_data(self, lines, end):
+        """馬データを詳細抽出（lines[:end]を対象）"""
+        # 枠番・馬番の行（"1    1" のような形式）を先に列挙
+        headers = [index for index in range(end) if _RE_FRAME_HORSE.match(lines[index])]
         
-        i = 0
-        while i < len(lines):
-            line = lines[i]
+        horses = []
+        position = 0
+        while position < len(headers):
+            start = headers[position]
+            horse_data, details_start = self.parse_horse_profile(lines, start, end)
             
-            # 枠番・馬番の検出（"1    1" のような形式）
-            frame_horse_match = re.match(r'^(\d+)\s+(\d+)\s*$', line.strip())
-            if frame_horse_match:
-                # 新しい馬のデータを開始
-                horse_data = {
-                    'frame_number': frame_horse_match.group(1),
-                    'horse_number': frame_horse_match.group(2),
-                    'horse_name': '',
-                    'father': '',
-                    'mother': '',
-                    'mother_father': '',
-                    'trainer': '',
-                    'jockey': '',
-                    'weight': '',
-                    'age': '',
-                    'sex': '',
-                    'coat_color': '',
-                    'odds': '',
-                    'popularity': '',
-                    'past_races': [],
-                    'stable_type': '',
-                    'recent_form': '',
-                    'load_weight': ''
-                }
-                
-                # 枠番・馬番の次の行から情報を順次抽出
-                j = i + 1
-                
-                # 1. 父名（次の行）
-                if j < len(lines) and lines[j].strip():
-                    horse_data['father'] = lines[j].strip()
-                    j += 1
-                
-                # 2. 馬名（その次の行、しばしば"B"が付く）
-                if j < len(lines) and lines[j].strip():
-                    horse_name = lines[j].strip()
-                    # "B"を除去（ブリンカー等の記号）
-                    horse_name = re.sub(r'B$', '', horse_name)
-                    horse_data['horse_name'] = horse_name
-                    j += 1
-                
-                # 3. 母名（その次の行）
-                if j < len(lines) and lines[j].strip():
-                    horse_data['mother'] = lines[j].strip()
-                    j += 1
-                
-                # 4. 母父名（括弧内）
-                if j < len(lines) and lines[j].strip():
-                    mother_father_line = lines[j].strip()
-                    mother_father_match = re.search(r'\(([^)]+)\)', mother_father_line)
-                    if mother_father_match:
-                        horse_data['mother_father'] = mother_father_match.group(1)
-                    j += 1
-                
-                # 5. 厩舎情報（美浦・調教師名）
-                if j < len(lines) and ('美浦' in lines[j] or '栗東' in lines[j]):
-                    stable_line = lines[j].strip()
-                    stable_match = re.search(r'(美浦|栗東)・(.+)', stable_line)
-                    if stable_match:
-                        horse_data['stable_type'] = stable_match.group(1)
-                        horse_data['trainer'] = stable_match.group(2).strip()
-                    j += 1
-                
-                # 次の数行で残りの情報を抽出（馬のデータが終わるまで）
-                k = j
-                while k < len(lines):
-                    current_line = lines[k].strip()
-                    
-                    # 次の馬のデータ開始を検出したら停止
-                    if re.match(r'^(\d+)\s+(\d+)\s*$', current_line):
-                        break
-                    
-                    if not current_line:
-                        k += 1
-                        continue
-                    
-                    # 馬体重
-                    weight_match = re.search(r'(\d+)kg\(([+-]?\d+)\)', current_line)
-                    if weight_match and not horse_data['weight']:
-                        horse_data['weight'] = f"{weight_match.group(1)}kg({weight_match.group(2)})"
-                        k += 1
-                        continue
-                    
-                    # オッズ・人気（"32.1 (9人気)"の形式）
-                    odds_popularity_match = re.search(r'(\d+\.\d+)\s+\((\d+)人気\)', current_line)
-                    if odds_popularity_match and not horse_data['odds']:
-                        horse_data['odds'] = odds_popularity_match.group(1)
-                        horse_data['popularity'] = odds_popularity_match.group(2) + '番人気'
-                        k += 1
-                        continue
-                    
-                    # 年齢・性別・毛色（"牡4栗"の形式）
-                    age_sex_color_match = re.search(r'^([牡牝セ])(\d+)(.+)$', current_line)
-                    if age_sex_color_match and not horse_data['age']:
-                        horse_data['sex'] = age_sex_color_match.group(1)
-                        horse_data['age'] = age_sex_color_match.group(2) + '歳'
-                        horse_data['coat_color'] = age_sex_color_match.group(3)
-                        
-                        # 年齢・性別・毛色行の次の行が騎手名
-                        if k + 1 < len(lines) and lines[k + 1].strip():
-                            next_line = lines[k + 1].strip()
-                            # その次の行が負担重量（数字.数字）かチェック
-                            if k + 2 < len(lines) and re.search(r'^\d+\.\d+$', lines[k + 2].strip()):
-                                horse_data['jockey'] = next_line
-                        
-                        k += 1
-                        continue
-                    
-                    # 負担重量（"58.0"の単独行）
-                    load_weight_match = re.search(r'^(\d+\.\d+)$', current_line)
-                    if load_weight_match and not horse_data['load_weight']:
-                        horse_data['load_weight'] = load_weight_match.group(1) + 'kg'
-                        k += 1
-                        continue
-                    
-                    # 過去のレース成績
-                    if re.search(r'\d{4}\.\d{2}\.\d{2}', current_line):
-                        # より多くの行を含めて勝ち馬名も確実に取得
-                        race_result = self.parse_past_race(current_line, lines[k:k+8])
-                        if race_result:
-                            horse_data['past_races'].append(race_result)
-                    
-                    k += 1
-                
-                horses.append(horse_data)
-                i = k  # 次の馬の開始位置に移動
-            else:
-                i += 1
+            # 血統・厩舎として読んだ行を除き、次の枠番・馬番の行までを1頭分のデータとする
+            while position < len(headers) and headers[position] < details_start:
+                position += 1
+            stop = headers[position] if position < len(headers) else end
+            
+            self.parse_horse_details(horse_data, lines, details_start, stop, end)
+            horses.append(horse_data)
         
         return horses
     
-    def parse_past_race(self, race_line, context_lines):
-        """過去のレース情報を解析"""
+    def parse_horse_profile(self, lines, start, end):
+        """枠番・馬番の行から血統・厩舎情報を抽出し、馬データと次の行の位置を返す"""
+        frame_horse_match = _RE_FRAME_HORSE.match(lines[start])
+        horse_data = _HORSE_TEMPLATE.copy()
+        horse_data['frame_number'] = frame_horse_match.group(1)
+        horse_data['horse_number'] = frame_horse_match.group(2)
+        horse_data['past_races'] = []
+        
+        # 枠番・馬番の次の行から情報を順次抽出
+        j = start + 1
+        
+        # 1. 父名（次の行）
+        if j < end:
+            horse_data['father'] = lines[j]
+            j += 1
+        
+        # 2. 馬名（その次の行、しばしば"B"が付く）
+        if j < end:
+            horse_name = lines[j]
+            # "B"を除去（ブリンカー等の記号）
+            if horse_name.endswith('B'):
+                horse_name = horse_name[:-1]
+            horse_data['horse_name'] = horse_name
+            j += 1
+        
+        # 3. 母名（その次の行）
+        if j < end:
+            horse_data['mother'] = lines[j]
+            j += 1
+        
+        # 4. 母父名（括弧内）
+        if j < end:
+            mother_father_line = lines[j]
+            mother_father_match = _RE_MOTHER_FATHER.search(mother_father_line)
+            if mother_father_match:
+                horse_data['mother_father'] = mother_father_match.group(1)
+            j += 1
+        
+        # 5. 厩舎情報（美浦・調教師名）
+        if j < end and ('美浦' in lines[j] or '栗東' in lines[j]):
+            stable_line = lines[j]
+            stable_match = _RE_STABLE.search(stable_line)
+            if stable_match:
+                horse_data['stable_type'] = stable_match.group(1)
+                horse_data['trainer'] = stable_match.group(2).strip()
+            j += 1
+        
+        return horse_data, j
+    
+    def parse_horse_details(self, horse_data, lines, start, stop, end):
+        """lines[start:stop]から馬体重・オッズ・年齢・負担重量・過去成績を抽出"""
+        for k in range(start, stop):
+            current_line = lines[k]
+            
+            # 馬体重
+            if (not horse_data['weight'] and 'kg(' in current_line and
+                    (weight_match := _RE_WEIGHT.search(current_line))):
+                horse_data['weight'] = f"{weight_match.group(1)}kg({weight_match.group(2)})"
+                continue
+            
+            # オッズ・人気（"32.1 (9人気)"の形式）
+            if (not horse_data['odds'] and '人気)' in current_line and
+                    (odds_popularity_match := _RE_ODDS.search(current_line))):
+                horse_data['odds'] = odds_popularity_match.group(1)
+                horse_data['popularity'] = odds_popularity_match.group(2) + '番人気'
+                continue
+            
+            # 年齢・性別・毛色（"牡4栗"の形式）
+            if (not horse_data['age'] and current_line[0] in '牡牝セ' and
+                    (age_sex_color_match := _RE_AGE_SEX.search(current_line))):
+                horse_data['sex'] = age_sex_color_match.group(1)
+                horse_data['age'] = age_sex_color_match.group(2) + '歳'
+                horse_data['coat_color'] = age_sex_color_match.group(3)
+                
+                # 年齢・性別・毛色行の次の行が騎手名
+                if k + 1 < end:
+                    next_line = lines[k + 1]
+                    # その次の行が負担重量（数字.数字）かチェック
+                    if k + 2 < end and _is_decimal_number(lines[k + 2]):
+                        horse_data['jockey'] = next_line
+                
+                continue
+            
+            # 負担重量（"58.0"の単独行）
+            if not horse_data['load_weight'] and _is_decimal_number(current_line):
+                horse_data['load_weight'] = current_line + 'kg'
+                continue
+            
+            # 過去のレース成績（日付"YYYY.MM.DD"は10文字以上で'.'を含むため先に安価に判定）
+            if (len(current_line) >= 10 and '.' in current_line and
+                    _RE_DATE.search(current_line)):
+                # より多くの行を含めて勝ち馬名も確実に取得
+                race_result = self.parse_past_race(lines, k, min(k + 8, end))
+                if race_result:
+                    horse_data['past_races'].append(race_result)
+
+    def parse_past_race(self, lines, start, stop):
+        """過去のレース情報を解析（lines[start]が日付行、lines[start:stop]がコンテキスト）"""
+        race_line = lines[start]
         # print(f"DEBUG: レース解析開始 - race_line='{race_line}'")
-        # print(f"DEBUG: context_lines 数: {len(context_lines)}")
-        # for i, line in enumerate(context_lines):
-        #     print(f"DEBUG: context_lines[{i}]: '{line}'")
-        race_result = {
-            'date': '',
-            'venue': '',
-            'race_name': '',
-            'course_info': '',
-            'finish_position': '',
-            'passage_position': '',
-            'field_size': '',
-            'popularity': '',
-            'jockey': '',
-            'weight': '',
-            'time': '',
-            'track_condition': '',
-            'winner_name': '',
-            'time_diff': ''
-        }
+        # print(f"DEBUG: context_lines 数: {stop - start}")
+        # for i in range(start, stop):
+        #     print(f"DEBUG: context_lines[{i - start}]: '{lines[i]}'")
+        race_result = _RACE_RESULT_TEMPLATE.copy()
         
         # 日付抽出
-        date_match = re.search(r'(\d{4})\.(\d{2})\.(\d{2})', race_line)
+        date_match = _RE_DATE.search(race_line)
         if date_match:
             race_result['date'] = f"{date_match.group(1)}/{date_match.group(2)}/{date_match.group(3)}"
         
         # 競馬場の抽出（JRA競馬場 + 地方競馬場）
-        jra_venues = ['東京', '中山', '阪神', '京都', '新潟', '福島', '小倉', '札幌', '函館', '中京']
-        local_venues = ['佐賀', '笠松', '園田', '姫路', '高知', '金沢', '浦和', '船橋', '大井', '川崎', '盛岡', '水沢', '門別']
-        all_venues = jra_venues + local_venues
-        
-        # 競馬場名を抽出（日付行から）
-        # "2025.05.18 佐賀1" → 競馬場: 佐賀, レース: 1
-        venue_match = re.search(r'\d{4}\.\d{2}\.\d{2}\s+(.+?)(\d+)', race_line)
+        # 競馬場名・着順を抽出（日付行から）
+        # "2025.05.18 佐賀1" → 競馬場: 佐賀, 着順: 1
+        venue_match = _RE_VENUE_FINISH.search(race_line)
         if venue_match:
-            venue_name = venue_match.group(1).strip()
-            # 完全一致する競馬場名を検索
-            for venue in all_venues:
-                if venue == venue_name:
-                    race_result['venue'] = venue
-                    break
-            # 部分一致でも検索
-            if not race_result['venue']:
-                for venue in all_venues:
-                    if venue in venue_name:
-                        race_result['venue'] = venue
-                        break
-        
-        # 競馬場名が見つからない場合の補完検索
-        if not race_result['venue']:
-            for venue in all_venues:
-                if venue in race_line:
-                    race_result['venue'] = venue
-                    break
-        
-        # 全ての行を結合してコンテキストを作成
-        all_text = race_line + ' ' + ' '.join(context_lines)
-        
-        # コース情報・タイム抽出
-        course_match = re.search(r'([ダ芝])(\d+)', all_text)
+            race_result['venue'] = venue_match.group(1)
+            race_result['finish_position'] = venue_match.group(2) + '着'
+        else:
+            # 着順がない場合は競馬場名のみ検索
+            venue_match = _RE_VENUE_ANY.search(race_line)
+            if venue_match:
+                race_result['venue'] = venue_match.group(0)
+        
+        # コース情報・タイム抽出（1行内で完結するパターンは行ごとに検索）
+        course_match = _search_lines(_RE_COURSE, lines, start, stop)
         if course_match:
             race_result['course_info'] = course_match.group(1) + course_match.group(2)
         
-        time_match = re.search(r'(\d+:\d+\.\d+)', all_text)
+        time_match = _search_lines(_RE_TIME, lines, start, stop)
         if time_match:
             race_result['time'] = time_match.group(1)
         
         # 天候状態
-        condition_match = re.search(r'(良|稍重|重|不良)', all_text)
+        condition_match = _search_lines(_RE_TRACK, lines, start, stop)
         if condition_match:
             race_result['track_condition'] = condition_match.group(1)
         
+        # 行をまたぐパターン用に全ての行を結合してコンテキストを作成
+        # （頭数・着順パターンはどちらも「頭」を含むため、該当行がなければ結合しない）
+        all_text = ''
+        if any('頭' in lines[index] for index in range(start, stop)):
+            all_text = race_line + ' ' + ' '.join(lines[start:stop])
+        
         # 頭数・馬番・人気の抽出（"15頭 4番 4人"の形式）
         # パターン1: "15頭 4番 4人 菅原明良 58.0"
-        basic_info_pattern = re.search(r'(\d+)頭\s+(\d+)番\s+(\d+)人', all_text)
+        basic_info_pattern = _RE_BASIC_INFO.search(all_text)
         if basic_info_pattern:
             race_result['field_size'] = basic_info_pattern.group(1) + '頭'
             # 4番は馬番なので、着順は別途検索
             race_result['popularity'] = basic_info_pattern.group(3) + '番人気'
         
-        # 着順の抽出（競馬場名+数字パターンが最優先）
-        # パターン1: "中京1", "小倉3" のような競馬場名+着順
-        for venue in all_venues:
-            pattern = rf'{venue}(\d+)'
-            venue_match = re.search(pattern, race_line)
-            if venue_match:
-                race_result['finish_position'] = venue_match.group(1) + '着'
-                break
-        
         # 通過順位の抽出（参考情報として）
         # パターン1: "3-3-3-2" のような詳細通過順位
-        detailed_passage = re.search(r'(\d+)-(\d+)-(\d+)-(\d+)', all_text)
+        detailed_passage = _search_lines(_RE_PASSAGE_DETAILED, lines, start, stop)
         if detailed_passage:
             race_result['passage_position'] = detailed_passage.group(0)
         else:
             # パターン2: "4-3" のような簡易通過順位
-            simple_passage = re.search(r'(\d+)-(\d+)', all_text)
+            simple_passage = _search_lines(_RE_PASSAGE_SIMPLE, lines, start, stop)
             if simple_passage:
                 race_result['passage_position'] = simple_passage.group(0)
         
         # 明示的な着順がある場合の別パターン（バックアップ）
         if not race_result['finish_position']:
             # "4着 16頭10番" のような形式
-            alt_pattern = re.search(r'(\d+)着.*?(\d+)頭.*?(\d+)番', all_text)
+            alt_pattern = _RE_ALT_RESULT.search(all_text)
             if alt_pattern:
                 race_result['finish_position'] = alt_pattern.group(1) + '着'
                 race_result['field_size'] = alt_pattern.group(2) + '頭'
                 # 人気は別途検索
-                pop_match = re.search(r'(\d+)番人気', all_text)
+                pop_match = _RE_POPULARITY.search(all_text)
                 if pop_match:
                     race_result['popularity'] = pop_match.group(1) + '番人気'
         
         # レース名抽出（JRA + 地方競馬場対応）
-        for line in context_lines:
-            # JRA競馬場のパターン
-            if ('クラス' in line or '未勝利' in line or '特別' in line or 'S' in line or 
-                'G' in line and ('I' in line or 'II' in line or 'III' in line)):
-                race_result['race_name'] = line.strip()
-                break
-            # 地方競馬場のパターン（UMATE、C2ー7組、出雲杯・春など）
-            elif (re.search(r'^[A-Z]+$', line) or  # UMATE
-                  re.search(r'^C\d', line) or      # C2ー7組
-                  '杯' in line or '賞' in line or '記念' in line or  # 出雲杯・春
-                  'JRA' in line or '交流' in line):  # JRA交流戦
-                race_result['race_name'] = line.strip()
+        for index in range(start, stop):
+            line = lines[index]
+            # JRA（クラス、未勝利、特別、G I など）・地方（UMATE、C2ー7組、出雲杯・春、JRA交流戦など）
+            if (_RE_RACE_NAME_KEYWORD.search(line) or
+                ('G' in line and 'I' in line) or                            # G I / G II / G III
+                (line.isascii() and line.isalpha() and line.isupper()) or  # UMATE
+                (line.startswith('C') and line[1:2].isdecimal())):         # C2ー7組
+                race_result['race_name'] = line
                 break
         
         # 勝ち馬とタイム差の抽出
-        for line in context_lines:
+        for index in range(start, stop):
+            line = lines[index]
             # "勝ち馬名(タイム差)" のパターンを検索
-            # 通過順位（数字-数字）を除外し、日本語を含む馬名のみ抽出
-            winner_diff_match = re.search(r'([^(]+)\(([0-9.-]+)\)', line)
+            # 日本語やアルファベットを含む馬名のみ抽出（通過順位「数字-数字」は除外される）
+            winner_diff_match = _RE_WINNER_DIFF.search(line)
             if winner_diff_match:
                 winner_name = winner_diff_match.group(1).strip()
                 time_diff_str = winner_diff_match.group(2)
@@ -485,149 +624,133 @@ class KeibaDataOrganizer:
                 # デバッグ用出力
                 # print(f"DEBUG: 行='{line}', 勝ち馬='{winner_name}', タイム差='{time_diff_str}'")
                 
-                # 通過順位パターン（数字-数字）を除外
-                if re.match(r'^[\d-]+$', winner_name):
-                    continue
+                race_result['winner_name'] = winner_name
                 
-                # 勝ち馬名が日本語やアルファベットを含む場合のみ処理
-                if re.search(r'[あ-んア-ンー一-龯a-zA-Z]', winner_name):
-                    race_result['winner_name'] = winner_name
-                    
-                    # タイム差の処理
-                    if time_diff_str == "-":
-                        race_result['time_diff'] = "-"  # 自分が1着
-                    elif time_diff_str == "0.0":
-                        race_result['time_diff'] = "0.0"  # 同着
-                    else:
-                        try:
-                            diff_value = float(time_diff_str)
-                            # 負の値も含めて正しくフォーマット
-                            race_result['time_diff'] = f"{diff_value:.1f}"
-                        except ValueError:
-                            race_result['time_diff'] = time_diff_str
-                    
-                    # デバッグ用出力
-                    # print(f"DEBUG: 設定完了 - winner_name='{race_result['winner_name']}', time_diff='{race_result['time_diff']}'")
-                    break
+                # タイム差の処理
+                if time_diff_str == "-":
+                    race_result['time_diff'] = "-"  # 自分が1着
+                elif time_diff_str == "0.0":
+                    race_result['time_diff'] = "0.0"  # 同着
+                else:
+                    try:
+                        diff_value = float(time_diff_str)
+                        # 負の値も含めて正しくフォーマット
+                        race_result['time_diff'] = f"{diff_value:.1f}"
+                    except ValueError:
+                        race_result['time_diff'] = time_diff_str
+                
+                # デバッグ用出力
+                # print(f"DEBUG: 設定完了 - winner_name='{race_result['winner_name']}', time_diff='{race_result['time_diff']}'")
+                break
         
         return race_result
     
-    def extract_training_data(self, lines):
-        """調教データを抽出"""
-        training_data = []
+    def parse_training_line(self, line):
+        """調教データ1行を解析"""
+        training_info = _TRAINING_TEMPLATE.copy()
         
-        in_training_section = False
-        for line in lines:
-            if '調教タイム' in line:
-                in_training_section = True
-                continue
-            
-            if in_training_section and re.search(r'\d+\.\d+', line):
-                training_info = {
-                    'horse_name': '',
-                    'date': '',
-                    'course': '',
-                    'condition': '',
-                    'jockey': '',
-                    'time': '',
-                    'evaluation': ''
-                }
-                
-                # 調教データの詳細解析
-                parts = line.split()
-                for part in parts:
-                    if re.search(r'\d{4}/\d{2}/\d{2}', part):
-                        training_info['date'] = part
-                    elif re.search(r'\d+\.\d+', part):
-                        training_info['time'] = part
-                
-                training_data.append(training_info)
+        # 調教データの詳細解析
+        parts = line.split()
+        for part in parts:
+            if _RE_SLASH_DATE.search(part):
+                training_info['date'] = part
+            elif _RE_DECIMAL.search(part):
+                training_info['time'] = part
         
-        return training_data
+        return training_info
     
     def create_race_summary_csv(self):
-        """レース概要CSVを作成"""
+        """レース概要CSVを作成（BOM付きUTF-8のバイト列）"""
         if not self.race_info:
             return None
         
-        race_summary = pd.DataFrame([self.race_info])
-        
-        csv_buffer = io.StringIO()
-        race_summary.to_csv(csv_buffer, index=False, encoding='utf-8')
-        return csv_buffer.getvalue()
+        stream, writer = _new_csv_writer()
+        writer.writerow(self.race_info.keys())
+        writer.writerow(self.race_info.values())
+        return stream.detach().getvalue()
     
     def create_horses_csv(self):
-        """出走馬詳細CSVを作成"""
+        """出走馬詳細CSVを作成（BOM付きUTF-8のバイト列）"""
         if not self.horses_data:
             return None
         
-        # 馬データを平坦化
-        flattened_data = []
-        for horse in self.horses_data:
-            horse_row = horse.copy()
-            
-            # 過去レース情報を文字列に変換
-            if horse_row['past_races']:
-                past_races_str = []
-                for race in horse_row['past_races'][:3]:  # 最新3走
-                    race_str = f"{race['date']} {race['venue']} {race['finish_position']}"
-                    past_races_str.append(race_str)
-                horse_row['recent_3_races'] = ' | '.join(past_races_str)
-            else:
-                horse_row['recent_3_races'] = ''
-            
-            # past_racesは除去（重複するため）
-            del horse_row['past_races']
-            
-            flattened_data.append(horse_row)
-        
-        horses_df = pd.DataFrame(flattened_data)
+        stream, writer = _new_csv_writer()
+        writer.writerow(_HORSE_CSV_COLUMNS)
+        horse_columns = _HORSE_CSV_COLUMNS[:-1]
+        writer.writerows(
+            [horse[column] for column in horse_columns] + [
+                # 過去レース情報を文字列に変換（past_racesは重複するため列には含めない）
+                ' | '.join(
+                    f"{race['date']} {race['venue']} {race['finish_position']}"
+                    for race in horse['past_races'][:3]  # 最新3走
+                )
+            ]
+            for horse in self.horses_data
+        )
         
-        csv_buffer = io.StringIO()
-        horses_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-        return csv_buffer.getvalue()
+        return stream.detach().getvalue()
     
     def create_detailed_race_results_csv(self):
-        """詳細レース成績CSVを作成"""
-        detailed_results = []
-        
-        for horse in self.horses_data:
-            for race in horse['past_races']:
-                result_row = {
-                    'horse_name': horse['horse_name'],
-                    'frame_number': horse['frame_number'],
-                    'horse_number': horse['horse_number'],
-                    'race_date': race['date'],
-                    'venue': race['venue'],
-                    'race_name': race['race_name'],
-                    'course_info': race['course_info'],
-                    'finish_position': race['finish_position'],
-                    'field_size': race['field_size'],
-                    'popularity': race['popularity'],
-                    'time': race['time'],
-                    'jockey': race['jockey'],
-                    'weight': race['weight']
-                }
-                detailed_results.append(result_row)
-        
-        if not detailed_results:
+        """詳細レース成績CSVを作成（BOM付きUTF-8のバイト列）"""
+        if not any(horse['past_races'] for horse in self.horses_data):
             return None
         
-        results_df = pd.DataFrame(detailed_results)
+        stream, writer = _new_csv_writer()
+        writer.writerow(_RESULT_CSV_COLUMNS)
+        
+        for horse in self.horses_data:
+            # 馬ごとの共通列は1回だけ取り出す
+            horse_columns = (horse['horse_name'], horse['frame_number'], horse['horse_number'])
+            writer.writerows(
+                horse_columns + (
+                    race['date'],
+                    race['venue'],
+                    race['race_name'],
+                    race['course_info'],
+                    race['finish_position'],
+                    race['field_size'],
+                    race['popularity'],
+                    race['time'],
+                    race['jockey'],
+                    race['weight']
+                )
+                for race in horse['past_races']
+            )
         
-        csv_buffer = io.StringIO()
-        results_df.to_csv(csv_buffer, index=False, encoding='utf-8')
-        return csv_buffer.getvalue()
+        return stream.detach().getvalue()
     
     def create_ai_readable_json(self):
         """AI向けの完全なJSON出力を作成（すべてのデータを含む）"""
+        return _dumps_json(self.build_ai_data())
+    
+    def create_ai_readable_json_bytes(self):
+        """ダウンロード用にAI向けJSONをUTF-8バイト列で作成"""
+        return _dumps_json_bytes(self.build_ai_data())
+    
+    def create_ai_json_preview(self, limit=1000):
+        """AI向けJSONの先頭limit文字を作成（必要な頭数分だけ変換）"""
+        horse_count = 1
+        while horse_count < len(self.horses_data):
+            preview_data = self.build_ai_data(horse_count)
+            del preview_data['training_data']
+            preview = _dumps_json(preview_data)
+            # 最後の馬の閉じ括弧までがlimit文字を超えていれば全体の先頭と一致する
+            if len(preview) - len('\n  ]\n}') >= limit:
+                return preview[:limit] + "..."
+            horse_count *= 2
+        
+        ai_json = self.create_ai_readable_json()
+        return ai_json[:limit] + "..." if len(ai_json) > limit else ai_json
+    
+    def build_ai_data(self, max_horses=None):
+        """AI向けJSONの元になる辞書を作成（max_horses指定時は先頭の馬のみ）"""
         ai_data = {
             "race_info": self.race_info,
             "horses": [],
             "training_data": self.training_data if hasattr(self, 'training_data') else []
         }
         
-        for horse in self.horses_data:
+        for horse in self.horses_data[:max_horses]:
             # 馬の基本情報（データ構造に合わせてすべてのフィールドを含む）
             horse_data = {
                 "frame_number": horse.get('frame_number', ''),
@@ -672,7 +795,14 @@ class KeibaDataOrganizer:
             
             ai_data["horses"].append(horse_data)
         
-        return json.dumps(ai_data, ensure_ascii=False, indent=2)
+        return ai_data
+
+@st.cache_data(show_spinner=False, max_entries=_PARSE_CACHE_MAX_ENTRIES)
+def _parse_keiba_data(keiba_data):
+    """入力テキストを解析し、(整理クラス, 解析結果)を返す（入力テキストごとにキャッシュ）"""
+    organizer = KeibaDataOrganizer()
+    parsed_data = organizer.parse_keiba_data(keiba_data)
+    return organizer, parsed_data
 
 def main():
     st.set_page_config(
@@ -747,8 +877,7 @@ def main():
     # データ解析実行
     if analyze_button and keiba_data:
         with st.spinner("🔍 競馬データ解析中..."):
-            organizer = KeibaDataOrganizer()
-            parsed_data = organizer.parse_keiba_data(keiba_data)
+            organizer, parsed_data = _parse_keiba_data(keiba_data)
         
         if parsed_data['horses_data']:
             st.success(f"✅ {len(parsed_data['horses_data'])}頭の馬データを解析しました！")
@@ -780,66 +909,56 @@ def main():
                         st.metric("馬場状態", race_info.get('track_condition', ''))
                         st.metric("向き", race_info.get('direction', ''))
                     
-                    # レース名・賞金
+                    # レース名・賞金（1つのMarkdownにまとめて表示）
+                    race_notes = []
                     if race_info.get('race_name'):
-                        st.write(f"**レース名:** {race_info['race_name']}")
+                        race_notes.append(f"**レース名:** {race_info['race_name']}")
                     if race_info.get('prize_money'):
-                        st.write(f"**賞金:** {race_info['prize_money']}")
+                        race_notes.append(f"**賞金:** {race_info['prize_money']}")
+                    if race_notes:
+                        st.markdown("  \n".join(race_notes))
             
             with tab2:
                 st.subheader("出走馬一覧")
                 horses_data = parsed_data['horses_data']
                 
                 if horses_data:
-                    # 出走馬の概要表示
-                    summary_data = []
-                    for horse in horses_data:
-                        summary_data.append({
-                            '枠': horse['frame_number'],
-                            '馬番': horse['horse_number'],
-                            '馬名': horse['horse_name'],
-                            '騎手': horse['jockey'],
-                            '調教師': horse['trainer'],
-                            '年齢': horse['age'],
-                            '性別': horse['sex'],
-                            'オッズ': horse['odds'],
-                            '人気': horse['popularity'],
-                            '馬体重': horse['weight']
-                        })
+                    # 出走馬の概要表示（列ごとのリストをそのまま渡す）
+                    summary_data = {
+                        label: [horse[key] for horse in horses_data]
+                        for key, label in _SUMMARY_COLUMN_NAMES.items()
+                    }
                     
-                    summary_df = pd.DataFrame(summary_data)
-                    st.dataframe(summary_df, use_container_width=True, hide_index=True)
+                    st.dataframe(summary_data, width="stretch", hide_index=True)
             
             with tab3:
                 st.subheader("過去５レース成績詳細")
                 
-                # 各馬の過去成績を表示
-                for horse in horses_data:  # 全頭表示
-                    if horse['past_races']:
-                        st.write(f"**{horse['horse_name']}** の過去成績")
-                        
-                        past_races_data = []
-                        for race in horse['past_races'][:5]:  # 最新5走
-                            past_races_data.append({
-                                '日付': race['date'],
-                                '競馬場': race['venue'],
-                                'コース': race['course_info'],
-                                '着順': race['finish_position'],
-                                '通過順位': race.get('passage_position', ''),
-                                '頭数': race['field_size'],
-                                '人気': race['popularity'],
-                                'タイム': race['time'],
-                                'タイム差': race.get('time_diff', '')
-                            })
-                        
-                        if past_races_data:
-                            past_df = pd.DataFrame(past_races_data)
-                            st.dataframe(past_df, use_container_width=True, hide_index=True)
-                        
-                        st.markdown("---")
+                # 全馬の最新5走を1つのDataFrameにまとめ、馬ごとに行範囲で切り出して表示
+                past_horses = [horse for horse in horses_data if horse['past_races']]  # 全頭表示
+                recent_races = [horse['past_races'][:5] for horse in past_horses]  # 最新5走
+                past_rows = [
+                    (race['date'], race['venue'], race['course_info'], race['finish_position'],
+                     race.get('passage_position', ''), race['field_size'], race['popularity'],
+                     race['time'], race.get('time_diff', ''))
+                    for races in recent_races
+                    for race in races
+                ]
+                all_past_df = pd.DataFrame.from_records(past_rows, columns=_PAST_RACE_COLUMNS)
+                
+                start = 0
+                for horse, races in zip(past_horses, recent_races):
+                    st.write(f"**{horse['horse_name']}** の過去成績")
+                    
+                    stop = start + len(races)
+                    st.dataframe(all_past_df.iloc[start:stop], width="stretch", hide_index=True)
+                    start = stop
+                    
+                    st.markdown("---")
             
             with tab4:
                 st.subheader("💾 データ出力・ダウンロード")
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 
                 # データ出力（CSV + AI向けJSON）
                 col1, col2, col3, col4 = st.columns(4)
@@ -847,104 +966,90 @@ def main():
                 if output_race_summary:
                     with col1:
                         st.subheader("🏁 レース概要CSV")
-                        race_csv = organizer.create_race_summary_csv()
-                        if race_csv:
+                        if race_info:
                             st.download_button(
                                 label="📄 レース概要CSV",
-                                data=race_csv,
-                                file_name=f"race_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                data=functools.partial(_cached_output, keiba_data, 'create_race_summary_csv', organizer),
+                                file_name=f"race_summary_{timestamp}.csv",
                                 mime="text/csv"
                             )
                 
                 if output_horses_detail:
                     with col2:
                         st.subheader("🐎 出走馬詳細CSV")
-                        horses_csv = organizer.create_horses_csv()
-                        if horses_csv:
+                        if horses_data:
                             st.download_button(
                                 label="📄 出走馬詳細CSV",
-                                data=horses_csv,
-                                file_name=f"horses_detail_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                data=functools.partial(_cached_output, keiba_data, 'create_horses_csv', organizer),
+                                file_name=f"horses_detail_{timestamp}.csv",
                                 mime="text/csv"
                             )
                 
                 if output_race_results:
                     with col3:
                         st.subheader("📈 過去成績CSV")
-                        results_csv = organizer.create_detailed_race_results_csv()
-                        if results_csv:
+                        if any(horse['past_races'] for horse in horses_data):
                             st.download_button(
                                 label="📄 過去成績CSV",
-                                data=results_csv,
-                                file_name=f"race_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                data=functools.partial(_cached_output, keiba_data, 'create_detailed_race_results_csv', organizer),
+                                file_name=f"race_results_{timestamp}.csv",
                                 mime="text/csv"
                             )
                 
                 # AI向けJSON出力
                 with col4:
                     st.subheader("🤖 AI向けJSON")
-                    ai_json = organizer.create_ai_readable_json()
-                    if ai_json:
-                        st.download_button(
-                            label="📄 AI向けJSON",
-                            data=ai_json,
-                            file_name=f"ai_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json"
-                        )
-                        
-                        # プレビュー表示
-                        with st.expander("JSONプレビュー"):
-                            st.code(ai_json[:1000] + "..." if len(ai_json) > 1000 else ai_json, language="json")
+                    st.download_button(
+                        label="📄 AI向けJSON",
+                        data=functools.partial(_cached_output, keiba_data, 'create_ai_readable_json_bytes', organizer),
+                        file_name=f"ai_data_{timestamp}.json",
+                        mime="application/json"
+                    )
+                    
+                    # プレビュー表示（先頭部分だけを変換）
+                    with st.expander("JSONプレビュー"):
+                        st.code(_cached_output(keiba_data, 'create_ai_json_preview', organizer), language="json")
                 
                 # Excel統合ファイル作成
                 st.subheader("📗 Excel統合ファイル")
-                if st.button("📊 全データExcel生成"):
+                sheets = []
+                
+                # レース概要シート
+                if output_race_summary and race_info:
+                    sheets.append(('レース概要', tuple(race_info), [tuple(race_info.values())]))
+                
+                # 出走馬詳細シート
+                if output_horses_detail and horses_data:
+                    sheets.append(('出走馬一覧', tuple(summary_data), list(zip(*summary_data.values()))))
+                
+                # 過去成績シート
+                if output_race_results:
+                    all_results = []
+                    for horse in horses_data:
+                        # 馬名は馬ごとに1回だけ取り出す
+                        horse_name = horse['horse_name']
+                        all_results.extend(
+                            (horse_name, race['date'], race['venue'], race['course_info'],
+                             race['finish_position'], race['field_size'], race['popularity'], race['time'])
+                            for race in horse['past_races']
+                        )
+                    if all_results:
+                        sheets.append(('過去成績', _EXCEL_RESULT_COLUMNS, all_results))
+                
+                if sheets:
+                    # 生成エラーを画面に表示できるよう、ブックはスクリプト実行中に作成（結果はキャッシュ）
+                    output_options = (output_race_summary, output_horses_detail, output_race_results)
                     try:
-                        excel_buffer = io.BytesIO()
-                        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                            
-                            # レース概要シート
-                            if output_race_summary and race_info:
-                                race_df = pd.DataFrame([race_info])
-                                race_df.to_excel(writer, sheet_name='レース概要', index=False)
-                            
-                            # 出走馬詳細シート
-                            if output_horses_detail and horses_data:
-                                horses_df = pd.DataFrame(summary_data)
-                                horses_df.to_excel(writer, sheet_name='出走馬一覧', index=False)
-                            
-                            # 過去成績シート
-                            if output_race_results:
-                                all_results = []
-                                for horse in horses_data:
-                                    for race in horse['past_races']:
-                                        result_row = {
-                                            '馬名': horse['horse_name'],
-                                            '日付': race['date'],
-                                            '競馬場': race['venue'],
-                                            'コース': race['course_info'],
-                                            '着順': race['finish_position'],
-                                            '頭数': race['field_size'],
-                                            '人気': race['popularity'],
-                                            'タイム': race['time']
-                                        }
-                                        all_results.append(result_row)
-                                
-                                if all_results:
-                                    results_df = pd.DataFrame(all_results)
-                                    results_df.to_excel(writer, sheet_name='過去成績', index=False)
-                        
-                        excel_data = excel_buffer.getvalue()
-                        
                         st.download_button(
                             label="📗 統合Excelダウンロード",
-                            data=excel_data,
-                            file_name=f"keiba_data_all_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                            data=_cached_excel(keiba_data, output_options, sheets),
+                            file_name=f"keiba_data_all_{timestamp}.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                         )
-                        
                     except Exception as e:
                         st.error(f"Excel生成エラー: {e}")
+                else:
+                    st.info("出力オプションでExcelに含めるデータが選択されていません")
                 
                 # データ説明
                 st.subheader("📝 出力データについて")